@@ -2,24 +2,64 @@ import io
 import os
 import json
 import time
+import concurrent.futures
+import functools
+import hashlib
+import re
 import tempfile, os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+import numpy as np
 import pandas as pd
 
+try:
+    import python_calamine  # noqa: F401
+    _HAS_CALAMINE = True
+except ImportError:
+    _HAS_CALAMINE = False
+
+try:
+    from rapidfuzz import fuzz, process as fuzz_process
+    _HAS_RAPIDFUZZ = True
+except ImportError:
+    _HAS_RAPIDFUZZ = False
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 RBI_URL = "https://www.rbi.org.in/scripts/bs_viewcontent.aspx?Id=2009"
 MAX_DOWNLOAD_BYTES = 25 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
 CACHE_TTL_SECONDS = 6 * 60 * 60
+INDEX_WORKERS = 16
 INDEX_PATH = os.environ.get(
     "INDEX_PATH",
     os.path.join(tempfile.gettempdir(), "in_banks.json")
 )
 os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+LINKS_CACHE_PATH = os.environ.get(
+    "LINKS_CACHE_PATH",
+    os.path.join(os.path.dirname(INDEX_PATH), "links_cache.json")
+)
+XLS_CACHE_DIR = os.environ.get(
+    "XLS_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "rbi_xls_cache")
+)
+os.makedirs(XLS_CACHE_DIR, exist_ok=True)
+
+# one session for all RBI traffic: keep-alive skips the TCP+TLS handshake per file
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+_session.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32))
+_session.headers["User-Agent"] = "rbi-ifsc-api/2.0"
 
 app = FastAPI(title="RBI API (banks / by-bank / by-ifsc)", version="2.0.0", docs_url="/")
 app.add_middleware(
@@ -31,50 +71,127 @@ app.add_middleware(
 )
 
 # ---------- Link list cache ----------
+_ANCHOR_STRAINER = SoupStrainer("a", href=True)
+_XLS_RE = re.compile(r"\.xlsx?$", re.I)
+_SCHEME_RE = re.compile(r"^https?://", re.I)
+
 _links_cache: Dict[str, Any] = {"ts": 0, "data": []}
 
 def fetch_xls_links() -> List[Dict[str, str]]:
-    resp = requests.get(RBI_URL, timeout=30)
+    resp = _session.get(RBI_URL, timeout=30)
     resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+    # lxml is a C parser; the strainer skips building every non-anchor node
+    soup = BeautifulSoup(resp.content, "lxml", parse_only=_ANCHOR_STRAINER)
     items = []
     for a in soup.find_all("a", href=True):
         href = a["href"].strip()
-        if href.lower().endswith((".xls", ".xlsx")):
-            url = href if href.lower().startswith(("http://", "https://")) else urljoin("https://www.rbi.org.in", href)
-            title = " ".join((a.get_text() or "").split()) or url.split("/")[-1]
+        if _XLS_RE.search(href):
+            url = href if _SCHEME_RE.match(href) else urljoin("https://www.rbi.org.in", href)
+            title = " ".join(a.stripped_strings) or url.split("/")[-1]
             items.append({"title": title, "url": url})
     if not items:
         raise HTTPException(status_code=404, detail="No Excel links found on RBI page.")
     return items
 
+def _load_links_cache() -> Optional[Dict[str, Any]]:
+    try:
+        with open(LINKS_CACHE_PATH, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("data"):
+            return cached
+    except Exception:
+        pass
+    return None
+
 def get_cached_links() -> List[Dict[str, str]]:
     now = time.time()
     if now - _links_cache["ts"] > CACHE_TTL_SECONDS or not _links_cache["data"]:
-        _links_cache["data"] = fetch_xls_links()
-        _links_cache["ts"] = now
+        # cold-start workers reuse the on-disk copy instead of re-scraping RBI
+        cached = _load_links_cache()
+        if cached and now - cached.get("ts", 0) <= CACHE_TTL_SECONDS:
+            _links_cache["data"] = cached["data"]
+            _links_cache["ts"] = cached["ts"]
+        else:
+            _links_cache["data"] = fetch_xls_links()
+            _links_cache["ts"] = now
+            try:
+                with open(LINKS_CACHE_PATH, "w", encoding="utf-8") as f:
+                    json.dump({"ts": now, "data": _links_cache["data"]}, f, ensure_ascii=False)
+            except OSError:
+                pass  # cache is best-effort
     return _links_cache["data"]
 
 # ---------- Helpers ----------
+def _cache_paths(url: str) -> Tuple[str, str]:
+    name = hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+    base = os.path.join(XLS_CACHE_DIR, name)
+    return base + ".xls", base + ".meta.json"
+
+def _load_cache_meta(meta_path: str) -> Dict[str, str]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
 def stream_download(url: str) -> bytes:
-    with requests.get(url, stream=True, timeout=60) as r:
+    data_path, meta_path = _cache_paths(url)
+    meta = _load_cache_meta(meta_path)
+    if meta and os.path.exists(data_path):
+        try:
+            head = _session.head(url, timeout=10, allow_redirects=True)
+            etag = head.headers.get("ETag", "")
+            last_mod = head.headers.get("Last-Modified", "")
+            if (etag or last_mod) and etag == meta.get("etag", "") and last_mod == meta.get("last_modified", ""):
+                with open(data_path, "rb") as f:
+                    return f.read()
+        except requests.RequestException:
+            pass  # validation failure falls through to a fresh download
+    with _session.get(url, stream=True, timeout=60) as r:
         r.raise_for_status()
         buf = io.BytesIO()
         total = 0
-        for chunk in r.iter_content(chunk_size=16384):
-            if not chunk:
-                continue
+        digest = hashlib.blake2b(digest_size=16)
+        # 256 KiB chunks: ~8x fewer Python loop trips than the old 16 KiB;
+        # requests filters keep-alive chunks itself when chunk_size is an int
+        for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
             buf.write(chunk)
+            digest.update(chunk)
             total += len(chunk)
             if total > MAX_DOWNLOAD_BYTES:
                 raise HTTPException(status_code=413, detail="File too large.")
-        return buf.getvalue()
+        data = buf.getvalue()
+        content_hash = digest.hexdigest()
+        try:
+            # RBI often re-hosts byte-identical files under fresh validators;
+            # an unchanged hash means only the sidecar metadata needs rewriting
+            if content_hash != meta.get("content_hash", "") or not os.path.exists(data_path):
+                with open(data_path, "wb") as f:
+                    f.write(data)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "url": url,
+                    "etag": r.headers.get("ETag", ""),
+                    "last_modified": r.headers.get("Last-Modified", ""),
+                    "content_hash": content_hash,
+                }, f)
+        except OSError:
+            pass  # cache is best-effort
+        return data
 
 def detect_engine(url: str) -> str:
+    if _HAS_CALAMINE:
+        return "calamine"  # Rust-backed reader; handles .xls, .xlsx and .xlsb uniformly
     return "openpyxl" if url.lower().endswith(".xlsx") else "xlrd"  # requires xlrd==1.2.0 for .xls
 
+def engine_kwargs(engine: str) -> Dict[str, Any]:
+    if engine == "openpyxl":
+        # streaming reader: skip building the full cell DOM
+        return {"read_only": True, "data_only": True, "keep_links": False}
+    return {}
+
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+    # rename in place: only .columns changes, so copying every cell is waste
     df.columns = [str(c).strip() for c in df.columns]
     return df
 
@@ -111,79 +228,190 @@ CANON_MAP = {
 }
 
 def coerce_number_like(x):
-    if pd.isna(x):
+    # dispatch on type; cells arrive from pandas as int/float/str, so the
+    # common cases never hit a pandas call or a raised exception
+    if x is None or x != x:  # x != x catches NaN
         return ""
+    if isinstance(x, (int, np.integer)):
+        return int(x)
+    if isinstance(x, float):
+        return int(x) if x.is_integer() else str(x)
+    s = str(x).strip()
     try:
-        f = float(x)
+        f = float(s)
         if f.is_integer():
             return int(f)
-    except Exception:
+    except ValueError:
         pass
-    s = str(x).strip()
-    if s.endswith(".0"):
-        try:
-            return int(float(s))
-        except Exception:
-            return s
     return s
 
-def to_output_row(raw: Dict[str, Any]) -> Dict[str, Any]:
-    tmp = {str(k).strip().lower(): v for k, v in raw.items()}
-    out: Dict[str, Any] = {k: "" for k in OUT_KEYS}
-    for lk, v in tmp.items():
-        if lk in CANON_MAP:
-            out[CANON_MAP[lk]] = "" if pd.isna(v) else v
-    if out["CITY1"] and not out["CITY2"]:
-        out["CITY2"] = out["CITY1"]
-    for k in ["BANK", "IFSC", "BRANCH", "STATE", "ADDRESS", "CITY1", "CITY2"]:
-        out[k] = "" if pd.isna(out[k]) else str(out[k]).strip()
-    out["STD CODE"] = coerce_number_like(out["STD CODE"])
-    out["PHONE"] = coerce_number_like(out["PHONE"])
-    out["IFSC"] = out["IFSC"].upper()
-    return out
+def canon_rename(cols: List[str]) -> Dict[str, str]:
+    """Raw header -> canonical OUT_KEYS name, for the headers CANON_MAP knows."""
+    rename = {}
+    for c in cols:
+        key = c.strip().lower()
+        if key in CANON_MAP:
+            rename[c] = CANON_MAP[key]
+    return rename
+
+def to_output_rows(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Whole-frame version of the old per-row normalization: rename to canonical
+    keys, strip/upper as column operations, coerce the phone-like columns.
+    Avoids the per-cell Python trip of building a dict for every row.
+    """
+    # columns are fixed per sheet, so the cached frame carries its rename map
+    rename = df.attrs.get("canon_rename")
+    if rename is None:
+        rename = canon_rename(list(df.columns))
+    out = df.rename(columns=rename)
+    # several raw headers can map to one canonical key; keep the last, like the
+    # old per-row dict overwrite did
+    out = out.loc[:, ~out.columns.duplicated(keep="last")]
+    out = out.reindex(columns=OUT_KEYS, fill_value="")
+    for c in ["BANK", "IFSC", "BRANCH", "ADDRESS", "CITY1", "CITY2", "STATE"]:
+        out[c] = out[c].fillna("").astype(str).str.strip()
+    out["IFSC"] = out["IFSC"].str.upper()
+    out.loc[out["CITY2"].eq("") & out["CITY1"].ne(""), "CITY2"] = out["CITY1"]
+    out["STD CODE"] = out["STD CODE"].map(coerce_number_like)
+    out["PHONE"] = out["PHONE"].map(coerce_number_like)
+    return out.to_dict(orient="records")
+
+# ---------- Parsed-sheet cache ----------
+# Bumped by build_index_file so stale DataFrames are re-parsed after a rebuild.
+_parse_cache_version = 0
+
+def _wanted_column(col: Any) -> bool:
+    # canonical output columns, plus anything IFSC-ish so the fuzzy
+    # find_ifsc_column fallback still has a column to find
+    key = str(col).strip().lower()
+    return key in CANON_MAP or "ifsc" in key
+
+@functools.lru_cache(maxsize=64)
+def _parsed_first_sheet(url: str, version: int) -> pd.DataFrame:
+    data = stream_download(url)
+    engine = detect_engine(url)
+    xls = pd.ExcelFile(io.BytesIO(data), engine=engine, engine_kwargs=engine_kwargs(engine))
+    if not xls.sheet_names:
+        return pd.DataFrame()
+    df = xls.parse(sheet_name=xls.sheet_names[0], usecols=_wanted_column)
+    if df.empty:
+        return df
+    df = normalize_columns(df)
+    df = df.fillna("")
+    df.attrs["canon_rename"] = canon_rename(list(df.columns))
+    col = find_ifsc_column(list(df.columns))
+    if col:
+        # upper(IFSC) -> row labels, so /by-ifsc is a dict hit instead of a column scan
+        ifsc_index: Dict[str, List[Any]] = {}
+        for label, ifsc in df[col].astype(str).str.upper().items():
+            ifsc_index.setdefault(ifsc, []).append(label)
+        df.attrs["ifsc_index"] = ifsc_index
+    return df
+
+def parsed_first_sheet(url: str) -> pd.DataFrame:
+    """Download + parse + normalize the FIRST SHEET, memoized per URL."""
+    return _parsed_first_sheet(url, _parse_cache_version)
 
 # ---------- Index build/load ----------
+def probe_first_row(data: bytes, url: str) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Column names + first data row of the FIRST SHEET only.
+    With calamine installed, read the two rows directly (no pandas, no full-sheet parse);
+    otherwise fall back to a pandas parse capped at nrows=1.
+    """
+    if _HAS_CALAMINE:
+        wb = python_calamine.CalamineWorkbook.from_filelike(io.BytesIO(data))
+        if not wb.sheet_names:
+            return [], {}
+        rows = wb.get_sheet_by_index(0).to_python(nrows=2)
+        if not rows:
+            return [], {}
+        cols = [str(c).strip() for c in rows[0]]
+        first = rows[1] if len(rows) > 1 else []
+        return cols, dict(zip(cols, first))
+    engine = detect_engine(url)
+    xls = pd.ExcelFile(io.BytesIO(data), engine=engine, engine_kwargs=engine_kwargs(engine))
+    if not xls.sheet_names:
+        return [], {}
+    head_df = normalize_columns(xls.parse(sheet_name=xls.sheet_names[0], nrows=1))
+    if head_df.empty:
+        return list(head_df.columns), {}
+    return list(head_df.columns), head_df.iloc[0].to_dict()
+
+def _index_one(item: Dict[str, str]) -> Dict[str, Any]:
+    try:
+        data = stream_download(item["url"])
+        cols, first_row = probe_first_row(data, item["url"])
+        bank_col = find_bank_column(cols)
+        ifsc_col = find_ifsc_column(cols)
+        bank_val = ("" if not bank_col else str(first_row.get(bank_col, "")).strip().upper())
+        ifsc_val = ("" if not ifsc_col else str(first_row.get(ifsc_col, "")).strip().upper())
+        ifsc_prefix = ifsc_val[:4] if len(ifsc_val) >= 4 else ""
+        return {"title": item["title"], "url": item["url"], "bank": bank_val, "ifsc_prefix": ifsc_prefix}
+    except Exception:
+        return {"title": item["title"], "url": item["url"], "bank": "", "ifsc_prefix": ""}
+
 def build_index_file() -> List[Dict[str, Any]]:
     """
     in_banks.json:
       [{title, url, bank, ifsc_prefix}]
     bank & ifsc_prefix are taken from the FIRST ROW of the FIRST SHEET only.
+    Files are downloaded and probed in parallel; downloads are I/O-bound and
+    the Excel readers release the GIL, so threads scale near-linearly.
     """
+    global _parse_cache_version
     items = get_cached_links()
-    index: List[Dict[str, Any]] = []
-    for item in items:
-        try:
-            data = stream_download(item["url"])
-            engine = detect_engine(item["url"])
-            xls = pd.ExcelFile(io.BytesIO(data), engine=engine)
-            if not xls.sheet_names:
-                index.append({"title": item["title"], "url": item["url"], "bank": "", "ifsc_prefix": ""})
-                continue
-            first_sheet = xls.sheet_names[0]
-            head_df = pd.read_excel(io.BytesIO(data), sheet_name=first_sheet, engine=engine, nrows=1)
-            head_df = normalize_columns(head_df)
-            bank_col = find_bank_column(list(head_df.columns))
-            ifsc_col = find_ifsc_column(list(head_df.columns))
-            bank_val = ("" if not bank_col else str(head_df.iloc[0][bank_col]).strip().upper())
-            ifsc_val = ("" if not ifsc_col else str(head_df.iloc[0][ifsc_col]).strip().upper())
-            ifsc_prefix = ifsc_val[:4] if len(ifsc_val) >= 4 else ""
-            index.append({"title": item["title"], "url": item["url"], "bank": bank_val, "ifsc_prefix": ifsc_prefix})
-        except Exception:
-            index.append({"title": item["title"], "url": item["url"], "bank": "", "ifsc_prefix": ""})
-            continue
-    with open(INDEX_PATH, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=INDEX_WORKERS) as pool:
+        index = list(pool.map(_index_one, items))
+    _parse_cache_version += 1
+    payload = orjson.dumps(index) if orjson else json.dumps(index, ensure_ascii=False).encode("utf-8")
+    tmp_path = INDEX_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, INDEX_PATH)  # atomic: readers never see a half-written index
     return index
 
+_index_cache: Dict[str, Any] = {"mtime": 0, "data": None}
+
 def load_index() -> List[Dict[str, Any]]:
     if os.path.exists(INDEX_PATH):
         try:
-            with open(INDEX_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
+            stat = os.stat(INDEX_PATH)
+            # same file as last time: skip the read + JSON parse entirely
+            if stat.st_mtime_ns == _index_cache["mtime"] and _index_cache["data"] is not None:
+                return _index_cache["data"]
+            with open(INDEX_PATH, "rb") as f:
+                raw = f.read()
+            data = orjson.loads(raw) if orjson else json.loads(raw)
+            _index_cache["mtime"] = stat.st_mtime_ns
+            _index_cache["data"] = data
+            return data
         except Exception:
             pass
     return build_index_file()
 
+# ---------- Index views ----------
+_index_views: Dict[str, Any] = {"src": None, "by_prefix": {}, "banks": []}
+
+def index_views(index: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, Dict[str, Any]]]]:
+    """
+    Derived lookup structures over the index list:
+      - ifsc_prefix -> entry (first entry wins, like the old candidates[0])
+      - (BANK_UPPER, entry) pairs for substring search
+    Rebuilt only when the index list object changes.
+    """
+    if _index_views["src"] is not index:
+        by_prefix: Dict[str, Dict[str, Any]] = {}
+        for e in index:
+            prefix = e.get("ifsc_prefix")
+            if prefix and prefix not in by_prefix:
+                by_prefix[prefix] = e
+        _index_views["by_prefix"] = by_prefix
+        _index_views["banks"] = [((e.get("bank") or "").upper(), e) for e in index]
+        _index_views["src"] = index
+    return _index_views["by_prefix"], _index_views["banks"]
+
 # ---------- Endpoints ----------
 @app.get("/health")
 def health():
@@ -206,6 +434,19 @@ def banks():
         raise HTTPException(status_code=404, detail="No banks found.")
     return out
 
+def _match_bank_entry(query: str, bank_entries: List[Tuple[str, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Substring match first (cheap, exact); RapidFuzz fallback for variants it misses."""
+    for b, e in bank_entries:
+        if query in b:
+            return e
+    if _HAS_RAPIDFUZZ and bank_entries:
+        best = fuzz_process.extractOne(
+            query, [b for b, _ in bank_entries], scorer=fuzz.WRatio, score_cutoff=80
+        )
+        if best:
+            return bank_entries[best[2]][1]
+    return None
+
 @app.get("/by-bank")
 def by_bank(bank: str = Query(..., description="Case-insensitive substring of the bank name")):
     """
@@ -221,30 +462,20 @@ def by_bank(bank: str = Query(..., description="Case-insensitive substring of th
     if not query:
         raise HTTPException(status_code=404, detail="No files matched the given bank.")
 
-    index = load_index()
-    candidates = [e for e in index if query in (e.get("bank") or "").upper()]
+    _, bank_entries = index_views(load_index())
+    entry = _match_bank_entry(query, bank_entries)
 
-    if not candidates:
-        index = build_index_file()
-        candidates = [e for e in index if query in (e.get("bank") or "").upper()]
-        if not candidates:
+    if entry is None:
+        _, bank_entries = index_views(build_index_file())
+        entry = _match_bank_entry(query, bank_entries)
+        if entry is None:
             raise HTTPException(status_code=404, detail="No files matched the given bank.")
 
-    entry = candidates[0]
     try:
-        data = stream_download(entry["url"])
-        engine = detect_engine(entry["url"])
-        xls = pd.ExcelFile(io.BytesIO(data), engine=engine)
-        if not xls.sheet_names:
-            raise HTTPException(status_code=404, detail="No files matched the given bank.")
-
-        first_sheet = xls.sheet_names[0]
-        df = pd.read_excel(io.BytesIO(data), sheet_name=first_sheet, engine=engine)
+        df = parsed_first_sheet(entry["url"])
         if df.empty:
             raise HTTPException(status_code=404, detail="No files matched the given bank.")
-        df = normalize_columns(df)
-        rows = [to_output_row(rec) for rec in df.fillna("").to_dict(orient="records")]
-        return rows
+        return to_output_rows(df)
     except HTTPException:
         raise
     except Exception:
@@ -263,35 +494,25 @@ def by_ifsc(ifsc: str = Query(..., description="IFSC (min length 11)")):
         raise HTTPException(status_code=404, detail="No rows found for the given IFSC.")
     prefix = code[:4]
 
-    index = load_index()
-    candidates = [e for e in index if e.get("ifsc_prefix") == prefix]
-    if not candidates:
-        index = build_index_file()
-        candidates = [e for e in index if e.get("ifsc_prefix") == prefix]
-        if not candidates:
+    by_prefix, _ = index_views(load_index())
+    entry = by_prefix.get(prefix)
+    if entry is None:
+        by_prefix, _ = index_views(build_index_file())
+        entry = by_prefix.get(prefix)
+        if entry is None:
             raise HTTPException(status_code=404, detail="No rows found for the given IFSC.")
 
-    entry = candidates[0]
     try:
-        data = stream_download(entry["url"])
-        engine = detect_engine(entry["url"])
-        xls = pd.ExcelFile(io.BytesIO(data), engine=engine)
-        if not xls.sheet_names:
-            raise HTTPException(status_code=404, detail="No rows found for the given IFSC.")
-
-        first_sheet = xls.sheet_names[0]
-        df = pd.read_excel(io.BytesIO(data), sheet_name=first_sheet, engine=engine)
+        df = parsed_first_sheet(entry["url"])
         if df.empty:
             raise HTTPException(status_code=404, detail="No rows found for the given IFSC.")
-        df = normalize_columns(df)
-        col = find_ifsc_column(list(df.columns))
-        if not col:
+        ifsc_index = df.attrs.get("ifsc_index")
+        if ifsc_index is None:
             raise HTTPException(status_code=404, detail="No rows found for the given IFSC.")
-        mask = df[col].astype(str).str.upper() == code
-        if not mask.any():
+        rows = ifsc_index.get(code)
+        if not rows:
             raise HTTPException(status_code=404, detail="No rows found for the given IFSC.")
-        results = [to_output_row(rec) for rec in df[mask].fillna("").to_dict(orient="records")]
-        return results
+        return to_output_rows(df.loc[rows])
     except HTTPException:
         raise
     except Exception: